@@ -1,135 +1,285 @@
+import os
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from scipy.stats import linregress
+import plotly.io as pio
 import streamlit as st
 
 # 1. Page Configuration
 st.set_page_config(layout="wide", page_title="Life Expectancy Dashboard")
 
+LE_FEMALE_COLUMN = 'Life expectancy - Sex: female - Age: 0 - Variant: estimates'
+USED_COLUMNS = ['Entity', 'Code', 'Year', 'Continent', LE_FEMALE_COLUMN]
+
+def read_dataset(file_path):
+    # Convert the CSV to Parquet once so cold starts read only the columns we use
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(file_path):
+        try:
+            return pd.read_parquet(parquet_path, columns=USED_COLUMNS)
+        except (OSError, ValueError):
+            pass  # unreadable cache file: rebuild it from the CSV below
+    df = pd.read_csv(file_path, usecols=USED_COLUMNS)[USED_COLUMNS]
+    # On a read-only deploy directory just use the parsed CSV rather than failing to write
+    if os.access(os.path.dirname(parquet_path) or '.', os.W_OK):
+        # Write beside the target and swap it in, so a crash never leaves a truncated file
+        tmp_path = parquet_path + '.tmp'
+        try:
+            df.to_parquet(tmp_path, engine='pyarrow', compression='zstd')
+            os.replace(tmp_path, parquet_path)
+        except (OSError, ValueError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df
+
 @st.cache_data
 def load_data(file_path):
-    df = pd.read_csv(file_path)
-    df = df.rename(columns={
-        'Life expectancy - Sex: female - Age: 0 - Variant: estimates': 'Life expectancy-female',
-        'Population - Sex: all - Age: all - Variant: estimates': 'Total Population'
-    })
-    df['Life expectancy-female'] = df.groupby('Entity')['Life expectancy-female'].transform(lambda x: x.fillna(x.median()))
+    df = read_dataset(file_path)
+    df = df.rename(columns={LE_FEMALE_COLUMN: 'Life expectancy-female'})
     df['Code'] = df['Code'].fillna('NA')
+    # A few hundred distinct labels each: integer codes make groupby and comparisons cheap
+    for col in ('Entity', 'Code', 'Continent'):
+        df[col] = df[col].astype('category')
+    # Fill gaps with each country's median, computed once per group and gathered by row.
+    # observed=False keeps the medians in category order, so Entity's codes index them directly.
+    medians = df.groupby('Entity', observed=False)['Life expectancy-female'].median().to_numpy()
+    values = df['Life expectancy-female'].to_numpy(copy=True)
+    nan_mask = np.isnan(values)
+    fill = medians[df['Entity'].cat.codes.to_numpy()]
+    values[nan_mask] = fill[nan_mask]
+    df['Life expectancy-female'] = values
+    # Years and ages fit comfortably in narrower types; halves the memory later passes touch
+    df['Year'] = df['Year'].astype('int16')
+    df['Life expectancy-female'] = df['Life expectancy-female'].astype('float32')
     return df
 
-df = load_data('dataset.csv')
-
-# 2. Data Filtering
 YEAR_START, YEAR_END = 2010, 2022
-mask = (df['Year'].between(YEAR_START, YEAR_END)) & (df['Code'] != 'NA')
-filtered_df = df[mask].copy()
 
-def get_slope(group):
-    if len(group) < 2: return 0
-    slope, _, _, _, _ = linregress(group['Year'], group['Life expectancy-female'])
-    return slope
+def compute_slopes(filtered_df):
+    # Least-squares slope per country from per-group sums (years offset from YEAR_START for precision)
+    ordered_df = filtered_df.sort_values('Entity', kind='stable')
+    group_codes, starts = np.unique(ordered_df['Entity'].cat.codes.to_numpy(), return_index=True)
+    entities = ordered_df['Entity'].cat.categories[group_codes]
+    x = ordered_df['Year'].to_numpy(float) - YEAR_START
+    y = ordered_df['Life expectancy-female'].to_numpy(float)
+    n = np.diff(np.r_[starts, len(x)])
+    # One segmented reduction over the stacked (x, y, xy, xx) columns gives every group's sums
+    sum_x, sum_y, sum_xy, sum_xx = np.add.reduceat(np.column_stack((x, y, x * y, x * x)), starts).T
+    denom = n * sum_xx - sum_x ** 2
+    growth = np.divide(n * sum_xy - sum_x * sum_y, denom, out=np.zeros_like(denom), where=denom != 0)
+
+    return pd.DataFrame({'Entity': entities, 'Growth_Rate': growth})
+
+def style_panel(fig, title, height):
+    fig.update_layout(
+        template="plotly_dark",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        height=height,
+        margin=dict(t=60, b=20, l=20, r=20),
+        uirevision='static',  # keep zoom/pan across full reruns
+        title_text=title
+    )
+
+# 2. Static Dashboard (independent of the selection, so built once per server)
+@st.cache_resource
+def build_dashboard():
+    df = load_data('dataset.csv')
+
+    # Data Filtering
+    # Read-only from here on, so a plain .loc selection is enough (no defensive copy)
+    na_code = df['Code'].cat.categories.get_indexer(['NA'])[0]
+    mask = df.eval(
+        "(Year >= @YEAR_START) & (Year <= @YEAR_END)",
+        local_dict={'YEAR_START': YEAR_START, 'YEAR_END': YEAR_END}
+    ) & (df['Code'].cat.codes != na_code)
+    filtered_df = df.loc[mask]
+
+    slopes = compute_slopes(filtered_df)
+    top_10 = slopes.nlargest(10, 'Growth_Rate').sort_values('Growth_Rate', ascending=True)
+
+    # Constructing the Dashboard Panels (separate figures, so a selection never relayouts the others)
+    # Bar Chart (with selection persistence)
+    bar_fig = go.Figure(go.Bar(
+        x=top_10['Growth_Rate'], y=top_10['Entity'], orientation='h',
+        marker=dict(color=top_10['Growth_Rate'], colorscale='Viridis'), 
+        showlegend=False, customdata=top_10['Entity'],
+        unselected=dict(marker=dict(opacity=1)),
+        selected=dict(marker=dict(opacity=1))
+    ))
+    style_panel(bar_fig, "Top 10 Growth Rates (Click a Bar to see the Trend)", height=380)
+
+    # Map
+    # Built once with the cached figure; only the three columns the trace needs are gathered
+    latest_year_data = filtered_df.loc[
+        filtered_df['Year'].to_numpy() == YEAR_END, ['Code', 'Life expectancy-female', 'Entity']
+    ]
+    # Categorical labels become plain strings once, right before they are handed to Plotly
+    latest_codes = latest_year_data['Code'].astype(str).to_numpy()
+    latest_entities = latest_year_data['Entity'].astype(str).to_numpy()
+    map_fig = go.Figure(go.Choropleth(
+        locations=latest_codes,
+        z=latest_year_data['Life expectancy-female'].to_numpy(),
+        text=latest_entities,
+        colorscale='Cividis',
+        colorbar=dict(thickness=15, len=0.75, title="Age"),
+        name="Map",
+        customdata=latest_entities,
+        unselected=dict(marker=dict(opacity=1)),
+        selected=dict(marker=dict(opacity=1))
+    ))
+    style_panel(map_fig, "Global Life Expectancy Map (Select a Country to see the Trend)", height=450)
+    map_fig.update_geos(projection_type="robinson", showocean=True, oceancolor="#1a1a1a")
+
+    # Box Plots from precomputed summary stats, so only five numbers per box reach the browser
+    box_rows = filtered_df.loc[
+        filtered_df['Continent'].notna() & filtered_df['Life expectancy-female'].notna(),
+        ['Continent', 'Life expectancy-female']
+    ]
+    continent = box_rows['Continent']
+    le = box_rows['Life expectancy-female']
+    # plotly.js interpolates box quartiles at position n*p - 0.5, i.e. numpy's 'hazen' method
+    box_stats = le.groupby(continent, sort=False, observed=True).agg(
+        q1=lambda v: np.quantile(v, 0.25, method='hazen'),
+        median='median',
+        q3=lambda v: np.quantile(v, 0.75, method='hazen')
+    )
+    # Whiskers end at the furthest points within 1.5 IQR, the rest are drawn as outlier markers
+    iqr = box_stats['q3'] - box_stats['q1']
+    lower = continent.map(box_stats['q1'] - 1.5 * iqr).to_numpy(dtype=float)
+    upper = continent.map(box_stats['q3'] + 1.5 * iqr).to_numpy(dtype=float)
+    within = ((le >= lower) & (le <= upper)).to_numpy()
+    box_stats = box_stats.join(
+        le[within].groupby(continent[within], sort=False, observed=True).agg(lowerfence='min', upperfence='max')
+    )
+    # Explicit colours so each continent's outliers match its box
+    colorway = pio.templates['plotly_dark'].layout.colorway
+    box_colors = {name: colorway[i % len(colorway)] for i, name in enumerate(box_stats.index)}
+    outliers = box_rows.loc[~within]
+    box_fig = go.Figure([
+        go.Box(
+            x=[str(row.Index)], q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            name=str(row.Index), marker_color=box_colors[row.Index], showlegend=False
+        )
+        for row in box_stats.itertuples()
+    ])
+    box_fig.add_trace(go.Scatter(
+        x=outliers['Continent'].astype(str).to_numpy(), y=outliers['Life expectancy-female'].to_numpy(),
+        mode='markers', name="Outliers", showlegend=False,
+        marker=dict(size=6, color=outliers['Continent'].map(box_colors).astype(str).to_numpy())
+    ))
+    style_panel(box_fig, "Distribution by Continent", height=450)
+
+    # Year-ordered trend arrays plus an entity -> positions index, so a selection is a gather rather than a scan
+    trend_df = filtered_df.sort_values('Year', kind='stable')
+    return {
+        'bar_fig': bar_fig,
+        'map_fig': map_fig,
+        'box_fig': box_fig,
+        'top10': top_10,
+        'entity_idx': trend_df.groupby('Entity', sort=False, observed=True).indices,
+        'years': trend_df['Year'].to_numpy(),
+        'values': trend_df['Life expectancy-female'].to_numpy(),
+    }
 
-slopes = filtered_df.groupby('Entity').apply(get_slope, include_groups=False).reset_index(name='Growth_Rate')
-top_10 = slopes.nlargest(10, 'Growth_Rate').sort_values('Growth_Rate', ascending=True)
+def make_trend_fig():
+    trend_fig = go.Figure(go.Scattergl(
+        mode='lines+markers', 
+        line=dict(color='#00CC96', width=3),
+        marker=dict(size=8, color='white', line=dict(width=2, color='#00CC96'))
+    ))
 
-# 3. Side Note (Positioned at the top for clarity)
+    trend_fig.update_layout(
+        template="plotly_dark",
+        height=400,
+        xaxis_title="Year",
+        yaxis_title="Life Expectancy (Age)",
+        margin=dict(t=20, b=40, l=40, r=20),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(30,30,30,0.5)"
+    )
+    return trend_fig
+
+TREND_MAX_POINTS = 1000
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep the first/last point and, per bucket, the point
+    # forming the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+    xf, yf = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = xf[next_lo:next_hi].mean(), yf[next_lo:next_hi].mean()
+        area = np.abs((xf[a] - avg_x) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (avg_y - yf[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+dashboard = build_dashboard()
+
+# 3. Title and Side Note (Positioned at the top for clarity)
+st.markdown("<h2 style='text-align: center;'>Global Life Expectancy: Spatial & Temporal Analysis</h2>", unsafe_allow_html=True)
 st.info("💡 **Interactive Guide:** Click on a bar in the **Top 10** chart or any country on the **Map** to view its specific historical data in the trend line at the bottom.")
 
-# 4. Constructing Main Dashboard
-fig = make_subplots(
-    rows=2, cols=2,
-    subplot_titles=(
-        "Top 10 Growth Rates (Click a Bar to see the Trend)", 
-        "Global Life Expectancy Map (Select a Country to see the Trend)", 
-        "Distribution by Continent"
-    ),
-    vertical_spacing=0.18,
-    horizontal_spacing=0.25,
-    specs=[[{"colspan": 2}, None], 
-           [{"type": "geo"}, {"type": "box"}]]
-)
-
-# Bar Chart (with selection persistence)
-fig.add_trace(go.Bar(
-    x=top_10['Growth_Rate'], y=top_10['Entity'], orientation='h',
-    marker=dict(color=top_10['Growth_Rate'], colorscale='Viridis'), 
-    showlegend=False, customdata=top_10['Entity'],
-    unselected=dict(marker=dict(opacity=1)),
-    selected=dict(marker=dict(opacity=1))
-), row=1, col=1)
-
-# Map
-latest_year_data = filtered_df[filtered_df['Year'] == YEAR_END]
-fig.add_trace(go.Choropleth(
-    locations=latest_year_data['Code'],
-    z=latest_year_data['Life expectancy-female'],
-    text=latest_year_data['Entity'],
-    colorscale='Cividis',
-    colorbar=dict(thickness=15, len=0.5, x=-0.12, y=0.2, title="Age"),
-    name="Map",
-    customdata=latest_year_data['Entity'],
-    unselected=dict(marker=dict(opacity=1)),
-    selected=dict(marker=dict(opacity=1))
-), row=2, col=1)
-
-# Box Plots
-for continent in filtered_df['Continent'].unique():
-    fig.add_trace(go.Box(
-        y=filtered_df[filtered_df['Continent'] == continent]['Life expectancy-female'],
-        name=str(continent), showlegend=False
-    ), row=2, col=2)
-
-fig.update_layout(
-    template="plotly_dark",
-    paper_bgcolor="rgba(0,0,0,0)",
-    plot_bgcolor="rgba(0,0,0,0)",
-    height=850,
-    margin=dict(t=80, b=20, l=20, r=20),
-    # --- CENTER THE TITLE HERE ---
-    title_text="Global Life Expectancy: Spatial & Temporal Analysis",
-    title_x=0.5,           # 0.5 centers the title
-    title_xanchor='center', # Ensures the anchor point is the center of the text
-    title_font=dict(size=24) # Optional: Increase size for better visibility
-)
-fig.update_geos(projection_type="robinson", showocean=True, oceancolor="#1a1a1a", row=2, col=1)
-
-# 5. Interaction Logic
-event_data = st.plotly_chart(fig, use_container_width=True, on_select="rerun")
-
-selected_country = top_10['Entity'].iloc[-1] 
-
-if event_data and "selection" in event_data:
-    points = event_data["selection"]["points"]
+# 4. Interaction Logic (a selection reruns only this fragment, not the whole page)
+def chart_key(chart):
+    # Bumping a chart's generation gives it a fresh widget key, which remounts it without a selection
+    return f"{chart}_chart_{st.session_state.get(f'{chart}_chart_generation', 0)}"
+
+def remember_selection(chart, other):
+    points = st.session_state[chart_key(chart)]["selection"]["points"]
     if points:
-        selected_country = points[0].get("customdata") or points[0].get("text") or points[0].get("y")
-
-# 6. Dynamic Detail Plot
-st.divider()
-st.subheader(f"Historical Trend Analysis: {selected_country}")
-
-trend_fig = go.Figure()
-country_df = filtered_df[filtered_df['Entity'] == selected_country]
-
-trend_fig.add_trace(go.Scatter(
-    x=country_df['Year'], y=country_df['Life expectancy-female'],
-    mode='lines+markers', 
-    line=dict(color='#00CC96', width=3),
-    marker=dict(size=8, color='white', line=dict(width=2, color='#00CC96'))
-))
-
-trend_fig.update_layout(
-    template="plotly_dark",
-    height=400,
-    xaxis_title="Year",
-    yaxis_title="Life Expectancy (Age)",
-    margin=dict(t=20, b=40, l=40, r=20),
-    paper_bgcolor="rgba(0,0,0,0)",
-    plot_bgcolor="rgba(30,30,30,0.5)"
-)
-
-st.plotly_chart(trend_fig, use_container_width=True)
+        st.session_state.selected_country = points[0].get("customdata") or points[0].get("text") or points[0].get("y")
+        # One selection at a time, as with the single baseline figure: a pick here clears the other
+        # chart, but only remount it when it actually holds a selection
+        if st.session_state.get(chart_key(other), {}).get("selection", {}).get("points"):
+            st.session_state[f'{other}_chart_generation'] = st.session_state.get(f'{other}_chart_generation', 0) + 1
+    else:
+        st.session_state.selected_country = None
+
+@st.fragment
+def interactive_panel(dashboard):
+    st.plotly_chart(dashboard['bar_fig'], use_container_width=True, key=chart_key("bar"),
+                    on_select=lambda: remember_selection("bar", "map"))
+    map_col, box_col = st.columns(2)
+    with map_col:
+        st.plotly_chart(dashboard['map_fig'], use_container_width=True, key=chart_key("map"),
+                        on_select=lambda: remember_selection("map", "bar"))
+    with box_col:
+        # Not selectable, but kept beside the map to preserve the layout; its summary-stat
+        # figure is about as small as the bar chart's, so re-sending it per click is cheap
+        st.plotly_chart(dashboard['box_fig'], use_container_width=True)
+
+    selected_country = st.session_state.get('selected_country') or dashboard['top10']['Entity'].iloc[-1]
+
+    # Dynamic Detail Plot
+    st.divider()
+    st.subheader(f"Historical Trend Analysis: {selected_country}")
+
+    # Kept per session (not shared) because the trace is restyled in place on every selection
+    if 'trend_fig' not in st.session_state:
+        st.session_state.trend_fig = make_trend_fig()
+    trend_fig = st.session_state.trend_fig
+
+    rows = dashboard['entity_idx'].get(selected_country, [])
+    years, values = dashboard['years'][rows], dashboard['values'][rows]
+    # Only ship about a chart's width of points if the series ever grows long
+    years, values = lttb(years, values, TREND_MAX_POINTS)
+    with trend_fig.batch_update():
+        trend_fig.data[0].x = years
+        trend_fig.data[0].y = values
+
+    st.plotly_chart(trend_fig, use_container_width=True)
+
+interactive_panel(dashboard)
 
 
 